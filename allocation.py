@@ -0,0 +1,927 @@
+"""Grant hour allocation logic shared by the Streamlit app and the HTTP service.
+
+Nothing in here depends on Streamlit, so it can be imported by worker
+processes and other tools without loading the UI.
+"""
+import random
+import re
+import time
+import pandas as pd
+
+WORKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+# Optional per-grant rules understood by the constraint solver
+CONSTRAINT_COLUMNS = ["Allowed Days", "Min Daily Hours", "Max Daily Hours", "Pinned Hours"]
+GRANT_COLUMNS = ["Grant Name", "Maximum Hours"] + CONSTRAINT_COLUMNS
+
+def normalize_grant_hours(grants_data):
+    # Convert dataframe to list of tuples and normalize to exact 0.25 hour increments
+    grants_list = []
+    total_original = 0
+    
+    for _, row in grants_data.iterrows():
+        name = row["Grant Name"]
+        # Round to nearest 0.25 to avoid floating point issues
+        original_hours = row["Maximum Hours"]
+        max_hours = round(original_hours * 4) / 4
+        grants_list.append((name, max_hours, original_hours))
+        total_original += original_hours
+    
+    # Adjust for any rounding discrepancies to ensure exactly 80 hours
+    total_after_rounding = sum(max_hours for _, max_hours, _ in grants_list)
+    
+    # If we're close to 80 hours but not exactly due to rounding,
+    # adjust the largest grant to make the total exactly 80
+    if abs(total_original - 80.0) < 0.1 and abs(total_after_rounding - 80.0) > 0.01:
+        # Find the largest grant
+        largest_idx = max(range(len(grants_list)), key=lambda i: grants_list[i][1])
+        name, hours, original = grants_list[largest_idx]
+        
+        # Adjust it to make the total exactly 80
+        adjusted_hours = hours + (80.0 - total_after_rounding)
+        # Still ensure it's in 0.25 increments
+        adjusted_hours = round(adjusted_hours * 4) / 4
+        
+        # Replace with adjusted value
+        grants_list[largest_idx] = (name, adjusted_hours, original)
+    
+    # Convert to the expected format for the algorithm
+    return [(name, hours) for name, hours, _ in grants_list]
+
+def allocate_hours(grants_data, warm_start=None, seed=None, time_limit=5.0):
+    # Grants with day restrictions, daily limits or pinned hours need the constraint
+    # solver, which is also the one that can follow a warm start pattern
+    if warm_start or has_constraints(grants_data):
+        return allocate_constrained_hours(grants_data, time_limit=time_limit, seed=seed, warm_start=warm_start)
+    
+    grants = normalize_grant_hours(grants_data)
+    
+    # A seed makes the random choices below, and so the schedule, reproducible
+    rng = random.Random(seed)
+    
+    # Define workdays
+    workdays = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+    
+    # Create a 2-week schedule structure
+    schedule = {
+        1: {day: [0.0 for _ in grants] for day in workdays},
+        2: {day: [0.0 for _ in grants] for day in workdays}
+    }
+    
+    # Get total hours for each day (8 hours)
+    day_total_target = 8.0
+    
+    # Track daily allocated hours
+    day_allocated = {week: {day: 0.0 for day in workdays} for week in [1, 2]}
+    
+    # Track allocated hours for each grant
+    grant_allocated = [0.0 for _ in grants]
+    
+    # Calculate total available hours across all grants after adjustments
+    total_available_hours = sum(max_hours for _, max_hours in grants)
+    
+    # Create a list of all days
+    all_days = [(week, day) for week in [1, 2] for day in workdays]
+    
+    # Check if we have exactly 80 hours (should be exact now)
+    is_80_hour_case = abs(total_available_hours - 80.0) < 0.01
+    
+    if is_80_hour_case:
+        # First, let's fill each day exactly to 8 hours
+        
+        # Shuffle days to randomize allocation
+        rng.shuffle(all_days)
+        
+        # Approach: Fill all days to exactly 8 hours using a greedy algorithm
+        
+        # Sort grants by size (largest first) to prioritize allocation
+        sorted_grants = sorted(enumerate(grants), key=lambda x: x[1][1], reverse=True)
+        
+        # Track remaining hours for each grant
+        remaining_hours = [hours for _, hours in grants]
+        
+        # Step 1: Try to fill each day with larger chunks first
+        for week, day in all_days:
+            # Reset day's allocated hours
+            day_allocated[week][day] = 0
+            for i in range(len(grants)):
+                schedule[week][day][i] = 0
+            
+            # Available hours for this day
+            available = 8.0
+            
+            # Try to allocate larger chunks first
+            possible_chunks = [8.0, 4.0, 2.0, 1.5, 1.0, 0.75, 0.5, 0.25]
+            
+            # Randomize the order of grants for this day
+            day_grants = list(sorted_grants)
+            rng.shuffle(day_grants)
+            
+            # Try each chunk size
+            for chunk in possible_chunks:
+                if chunk > available or chunk < 0.25:
+                    continue
+                
+                # Try to find grants that can use this chunk size
+                for idx, (i, (name, _)) in enumerate(day_grants):
+                    if remaining_hours[i] >= chunk:
+                        # Allocate this chunk
+                        schedule[week][day][i] += chunk
+                        day_allocated[week][day] += chunk
+                        remaining_hours[i] -= chunk
+                        available -= chunk
+                        
+                        # If this grant is now fully allocated, remove it
+                        if remaining_hours[i] < 0.25:
+                            day_grants.pop(idx)
+                        
+                        # If the day is full, break
+                        if available < 0.25:
+                            break
+                        
+                        # If more of this chunk can be allocated, try again
+                        if available >= chunk:
+                            continue
+                
+                # If the day is full, break
+                if available < 0.25:
+                    break
+            
+            # If we still have space, fill with remaining hours
+            if available >= 0.25:
+                # Use any grant with remaining hours
+                for idx, (i, (name, _)) in enumerate(day_grants):
+                    if remaining_hours[i] >= 0.25:
+                        # Calculate how much to allocate
+                        allocation = min(remaining_hours[i], available)
+                        allocation = round(allocation * 4) / 4  # Round to nearest 0.25
+                        
+                        if allocation >= 0.25:
+                            schedule[week][day][i] += allocation
+                            day_allocated[week][day] += allocation
+                            remaining_hours[i] -= allocation
+                            available -= allocation
+                        
+                        # If this grant is now fully allocated, remove it
+                        if remaining_hours[i] < 0.25:
+                            day_grants.pop(idx)
+                        
+                        # If the day is full, break
+                        if available < 0.25:
+                            break
+        
+        # Step 2: After initial allocation, verify and adjust
+        # Calculate actual allocated hours
+        for i in range(len(grants)):
+            grant_allocated[i] = sum(schedule[week][day][i] for week in [1, 2] for day in workdays)
+        
+        # Check if any grants are under-allocated
+        for i, (name, max_hours) in enumerate(grants):
+            if abs(grant_allocated[i] - max_hours) > 0.01:
+                # Find how much is still needed
+                needed = max_hours - grant_allocated[i]
+                
+                if needed > 0:
+                    # Find days that can accommodate more hours
+                    for week in [1, 2]:
+                        for day in workdays:
+                            # Check if this day has room
+                            day_total = sum(schedule[week][day])
+                            if day_total < 8.0 - 0.01:
+                                # Calculate how much to add
+                                available = 8.0 - day_total
+                                allocation = min(needed, available)
+                                allocation = round(allocation * 4) / 4  # Round to nearest 0.25
+                                
+                                if allocation >= 0.25:
+                                    schedule[week][day][i] += allocation
+                                    grant_allocated[i] += allocation
+                                    needed -= allocation
+                                
+                                # If we've allocated all needed hours, break
+                                if needed < 0.01:
+                                    break
+                        
+                        # If we've allocated all needed hours, break
+                        if needed < 0.01:
+                            break
+                
+                elif needed < 0:
+                    # We've over-allocated - reduce allocation
+                    excess = -needed
+                    
+                    for week in [1, 2]:
+                        for day in workdays:
+                            if schedule[week][day][i] > 0:
+                                reduction = min(excess, schedule[week][day][i])
+                                reduction = round(reduction * 4) / 4  # Round to nearest 0.25
+                                
+                                schedule[week][day][i] -= reduction
+                                grant_allocated[i] -= reduction
+                                excess -= reduction
+                                
+                                # If we've fixed the excess, break
+                                if excess < 0.01:
+                                    break
+                        
+                        # If we've fixed the excess, break
+                        if excess < 0.01:
+                            break
+        
+        # Step 3: Final check - ensure each day has exactly 8 hours
+        for week in [1, 2]:
+            for day in workdays:
+                day_total = sum(schedule[week][day])
+                
+                # If day is not exactly 8 hours (considering precision issues)
+                if abs(day_total - 8.0) > 0.01:
+                    # Adjust by adding or removing hours
+                    if day_total < 8.0:  # Need to add hours
+                        shortage = 8.0 - day_total
+                        # Try to find a grant with remaining hours
+                        for i, (name, max_hours) in enumerate(grants):
+                            if grant_allocated[i] < max_hours - 0.01:
+                                to_add = min(shortage, max_hours - grant_allocated[i])
+                                to_add = round(to_add * 4) / 4  # Round to nearest 0.25
+                                
+                                if to_add >= 0.25:
+                                    schedule[week][day][i] += to_add
+                                    grant_allocated[i] += to_add
+                                    shortage -= to_add
+                                
+                                if shortage < 0.01:
+                                    break
+                    else:  # Need to remove hours
+                        excess = day_total - 8.0
+                        # Find a grant with hours allocated on this day
+                        for i in range(len(grants)):
+                            if schedule[week][day][i] > 0:
+                                to_remove = min(excess, schedule[week][day][i])
+                                to_remove = round(to_remove * 4) / 4  # Round to nearest 0.25
+                                
+                                if to_remove >= 0.25:
+                                    schedule[week][day][i] -= to_remove
+                                    grant_allocated[i] -= to_remove
+                                    excess -= to_remove
+                                
+                                if excess < 0.01:
+                                    break
+    else:
+        # For non-80-hour cases, use a simpler distribution approach
+        # Shuffle days for randomization
+        rng.shuffle(all_days)
+        
+        # Sort grants from largest to smallest
+        sorted_grants = sorted(enumerate(grants), key=lambda x: x[1][1], reverse=True)
+        
+        # Allocate each grant
+        for i, (name, max_hours) in sorted_grants:
+            if max_hours <= 0.0:
+                continue
+                
+            remaining = max_hours
+            days_to_use = all_days.copy()
+            rng.shuffle(days_to_use)
+            
+            # Create varied chunks for more random allocation patterns
+            standard_chunks = [4.0, 3.75, 3.5, 3.25, 3.0, 2.75, 2.5, 2.25, 2.0, 1.75, 1.5, 1.25, 1.0, 0.75, 0.5, 0.25]
+            # Use a random subset for this particular grant
+            num_chunks = rng.randint(4, 10)
+            varied_chunks = rng.sample(standard_chunks, min(num_chunks, len(standard_chunks)))
+            varied_chunks.sort(reverse=True)
+            
+            while remaining > 0.01 and days_to_use:
+                week, day = days_to_use.pop(0)
+                available = day_total_target - day_allocated[week][day]
+                
+                if available < 0.25:
+                    continue
+                
+                allocation = None
+                # Decide whether to use a standard chunk or a more creative allocation
+                if rng.random() < 0.7:  # 70% chance to use varied chunks
+                    # Find a suitable chunk from our varied set
+                    for chunk in varied_chunks:
+                        if chunk <= available and chunk <= remaining:
+                            allocation = chunk
+                            break
+                
+                # If no allocation yet or we're using creative allocation (30% chance)
+                if allocation is None or rng.random() < 0.3:
+                    # Use a random allocation for more variety
+                    max_alloc = min(available, remaining)
+                    # Choose a random value between 0.25 and the maximum available
+                    allocation = 0.25 + (rng.random() * (max_alloc - 0.25))
+                    allocation = round(allocation * 4) / 4  # Round to nearest 0.25
+                else:
+                    allocation = min(remaining, available)
+                    # Round to nearest 0.25
+                    allocation = round(allocation * 4) / 4
+                
+                if allocation >= 0.25:
+                    schedule[week][day][i] += allocation
+                    day_allocated[week][day] += allocation
+                    grant_allocated[i] += allocation
+                    remaining = max_hours - grant_allocated[i]
+    
+    # Final verification - make sure we haven't exceeded any grant maximums
+    for i, (name, max_hours) in enumerate(grants):
+        total = sum(schedule[week][day][i] for week in [1, 2] for day in workdays)
+        if total > max_hours + 0.01:
+            # This shouldn't happen with the logic above, but just in case
+            excess = total - max_hours
+            for week in [1, 2]:
+                for day in workdays:
+                    if schedule[week][day][i] > 0 and excess > 0.01:
+                        reduction = min(excess, schedule[week][day][i])
+                        schedule[week][day][i] -= reduction
+                        day_allocated[week][day] -= reduction
+                        excess -= reduction
+    
+    return schedule, grants
+
+def is_blank(value):
+    """Check whether a constraint cell was left empty"""
+    return value is None or (not isinstance(value, str) and pd.isna(value)) or str(value).strip() == ""
+
+def match_workday(token):
+    """Match a day name or abbreviation such as "Tue" to a workday"""
+    prefix = token.strip().lower()
+    for day in WORKDAYS:
+        if len(prefix) >= 3 and day.lower().startswith(prefix):
+            return day
+    raise ValueError(f"Unknown day '{token.strip()}' - use Monday through Friday")
+
+def parse_allowed_days(value):
+    """Parse a list of days such as "Tue, Thu" (blank means every day)"""
+    if is_blank(value):
+        return list(WORKDAYS)
+    
+    days = []
+    for token in re.split(r"[,/;]", str(value)):
+        if token.strip():
+            day = match_workday(token)
+            if day not in days:
+                days.append(day)
+    return days
+
+def parse_pinned_hours(value):
+    """Parse pinned hours such as "Fri=2, Mon=0.5" into a {day: hours} dict"""
+    pinned = {}
+    if is_blank(value):
+        return pinned
+    
+    for token in re.split(r"[,;]", str(value)):
+        if not token.strip():
+            continue
+        day_part, sep, hours_part = token.replace(":", "=").partition("=")
+        if not sep:
+            raise ValueError(f"Pinned hours '{token.strip()}' should look like 'Friday=2'")
+        try:
+            hours = float(hours_part)
+        except ValueError:
+            raise ValueError(f"Invalid pinned hours '{token.strip()}'")
+        pinned[match_workday(day_part)] = hours
+    return pinned
+
+def has_constraints(grants_data):
+    """Check whether any grant has day restrictions, daily limits or pinned hours"""
+    for column in CONSTRAINT_COLUMNS:
+        if column in grants_data.columns:
+            if not grants_data[column].map(is_blank).all():
+                return True
+    return False
+
+def build_grant_constraints(grants_data):
+    """Read the constraint columns into one dict per grant, in quarter hours"""
+    constraints = []
+    
+    for _, row in grants_data.iterrows():
+        name = row["Grant Name"]
+        allowed_days = parse_allowed_days(row.get("Allowed Days"))
+        pinned = parse_pinned_hours(row.get("Pinned Hours"))
+        
+        min_daily = row.get("Min Daily Hours")
+        max_daily = row.get("Max Daily Hours")
+        min_quarters = 0 if is_blank(min_daily) else round(float(min_daily) * 4)
+        max_quarters = 32 if is_blank(max_daily) else min(round(float(max_daily) * 4), 32)
+        
+        if min_quarters > max_quarters:
+            raise ValueError(f"{name}: minimum daily hours exceed maximum daily hours")
+        
+        for day, hours in pinned.items():
+            if day not in allowed_days:
+                raise ValueError(f"{name}: pinned hours on {day} but {day} is not an allowed day")
+            if not 0 <= hours <= 8:
+                raise ValueError(f"{name}: pinned hours on {day} must be between 0 and 8")
+            # Zero pins a day off, so only non-zero pins have to respect the daily limits
+            if round(hours * 4) > max_quarters:
+                raise ValueError(f"{name}: pinned hours on {day} exceed its maximum daily hours")
+            if 0 < round(hours * 4) < min_quarters:
+                raise ValueError(f"{name}: pinned hours on {day} are below its minimum daily hours")
+
+        constraints.append({
+            "days": allowed_days,
+            "min": min_quarters,
+            "max": max_quarters,
+            "pinned": {day: round(hours * 4) for day, hours in pinned.items()}
+        })
+    
+    return constraints
+
+def block_amounts(cap, minimum, pinned):
+    """List the quarter-hour amounts a grant may take on one day"""
+    if pinned is not None:
+        return [pinned]
+    return [0] + list(range(max(minimum, 1), cap + 1))
+
+def reachable_totals(options_by_day, limit):
+    """Bitmask of totals up to limit (bit n set means n quarters) from one option per day"""
+    mask = (1 << (limit + 1)) - 1
+    reachable = 1
+    for options in options_by_day:
+        extended = 0
+        for amount in options:
+            extended |= reachable << amount
+        reachable = extended & mask
+    return reachable
+
+def transport_feasible(supply, demand, caps, required):
+    """Check whether required quarters can flow from supply rows to demand columns.
+    
+    caps[i][j] bounds what row i sends to column j. This is a max-flow over the
+    bipartite grant/day graph, started greedily and finished with augmenting paths.
+    """
+    num_rows, num_cols = len(supply), len(demand)
+    flow = [[0] * num_cols for _ in range(num_rows)]
+    sent = [0] * num_rows
+    received = [0] * num_cols
+    total = 0
+    
+    for i in range(num_rows):
+        for j in range(num_cols):
+            amount = min(caps[i][j], supply[i] - sent[i], demand[j] - received[j])
+            if amount > 0:
+                flow[i][j] = amount
+                sent[i] += amount
+                received[j] += amount
+                total += amount
+    
+    while total < required:
+        # Search from rows with supply left, through columns and back along used
+        # edges, until a column with demand left is found
+        row_parent = {i: None for i in range(num_rows) if sent[i] < supply[i]}
+        col_parent = {}
+        queue = list(row_parent)
+        end = None
+        for i in queue:
+            for j in range(num_cols):
+                if j in col_parent or flow[i][j] >= caps[i][j]:
+                    continue
+                col_parent[j] = i
+                if received[j] < demand[j]:
+                    end = j
+                    break
+                for back in range(num_rows):
+                    if back not in row_parent and flow[back][j] > 0:
+                        row_parent[back] = j
+                        queue.append(back)
+            if end is not None:
+                break
+        if end is None:
+            return False
+        
+        # Push as much as the narrowest edge on the path allows
+        amount = demand[end] - received[end]
+        j = end
+        while True:
+            i = col_parent[j]
+            amount = min(amount, caps[i][j] - flow[i][j])
+            if row_parent[i] is None:
+                amount = min(amount, supply[i] - sent[i])
+                break
+            j = row_parent[i]
+            amount = min(amount, flow[i][j])
+        
+        received[end] += amount
+        j = end
+        while True:
+            i = col_parent[j]
+            flow[i][j] += amount
+            if row_parent[i] is None:
+                sent[i] += amount
+                break
+            j = row_parent[i]
+            flow[i][j] -= amount
+        total += amount
+    
+    return True
+
+def solve_allocation(targets, caps, minimums, fixed, grant_exact, day_exact, rng, node_limit=5000,
+                     preferred=None, deadline=None, failed_states=None):
+    """Backtracking search over the quarter-hour grid.
+    
+    All amounts are in quarter hours. caps[g][d] is the most grant g may take on
+    day d, minimums[g] is the smallest non-zero block and fixed[g][d] is a pinned
+    amount (or None). preferred[g], when given, is the amount per day the search
+    tries first for grant g. Returns the allocation, or None if the node limit
+    or the time.monotonic() deadline was hit. Raises ValueError when the search
+    proves there is no solution. failed_states, when given, is shared between
+    calls so later restarts skip states already proven dead.
+    """
+    num_grants = len(targets)
+    num_days = len(caps[0]) if caps else 0
+    day_quarters = 32
+    
+    allocation = [[0] * num_days for _ in range(num_grants)]
+    remaining = list(targets)
+    open_days = set(range(num_days))
+    if failed_states is None:
+        failed_states = set()
+    
+    # Amounts each grant could take on each day on its own
+    amounts = [
+        [block_amounts(caps[g][d], minimums[g], fixed[g][d]) for d in range(num_days)]
+        for g in range(num_grants)
+    ]
+    
+    def reach_over(g, days):
+        # Totals grant g could still add up to over the given days; no grant can
+        # pass a full day on each of them, so huge totals don't need a wider mask
+        limit = min(remaining[g], len(days) * day_quarters)
+        return reachable_totals((amounts[g][d] for d in days), limit)
+    
+    def day_room(g, d):
+        # Largest single block grant g could still take on day d
+        if fixed[g][d] is not None:
+            return fixed[g][d] if fixed[g][d] <= remaining[g] else 0
+        largest = min(caps[g][d], remaining[g])
+        return largest if largest >= max(minimums[g], 1) else 0
+    
+    def block_options(g, d, day_left, later_reach):
+        # Amounts that fit today and still let the grant finish on the other open days
+        options = [v for v in amounts[g][d] if v <= remaining[g] and v <= day_left]
+        if grant_exact:
+            options = [v for v in options if (later_reach[g] >> (remaining[g] - v)) & 1]
+        else:
+            # Grants may finish short, but must keep enough for their pinned hours,
+            # i.e. the smallest total they can still reach later must fit
+            smallest = (later_reach[g] & -later_reach[g]).bit_length() - 1
+            options = [v for v in options if 0 <= smallest <= remaining[g] - v]
+        return options
+    
+    def spread_fits():
+        # Can the grants' remaining hours be spread over the open days within their
+        # daily caps, once pinned cells are taken out? Unlike the per-grant and
+        # per-day checks, this catches grants competing for the same days.
+        days = list(open_days)
+        supply = list(remaining)
+        demand = []
+        flow_caps = [[0] * len(days) for _ in range(num_grants)]
+        for j, d in enumerate(days):
+            left = day_quarters
+            for g in range(num_grants):
+                if fixed[g][d] is not None:
+                    supply[g] -= fixed[g][d]
+                    left -= fixed[g][d]
+                else:
+                    flow_caps[g][j] = caps[g][d]
+            demand.append(left)
+        if min(supply, default=0) < 0 or min(demand, default=0) < 0:
+            return False
+        total_supply, total_demand = sum(supply), sum(demand)
+        if grant_exact and total_supply > total_demand:
+            return False
+        if day_exact and total_demand > total_supply:
+            return False
+        return transport_feasible(supply, demand, flow_caps, min(total_supply, total_demand))
+    
+    def preferred_amount(g, d):
+        # Follow the warm start layout when there is one
+        if preferred is not None and preferred[g] is not None:
+            return preferred[g][d]
+        
+        # Otherwise aim for an even share of what is left, jittered for variety
+        days_left = sum(1 for dd in open_days if caps[g][dd] > 0)
+        share = remaining[g] / days_left if days_left else 0
+        # A share below the minimum block can't be spread evenly, so use whole
+        # blocks on a matching fraction of the days instead
+        if 0 < share < minimums[g]:
+            return minimums[g] if rng.random() < share / minimums[g] else 0
+        return share * rng.uniform(0.5, 1.5)
+    
+    nodes = 0
+    limit_hit = False
+    
+    def fill_day(d, order, k, day_left, later_reach):
+        nonlocal nodes, limit_hit
+        if k == len(order):
+            open_days.discard(d)
+            done = next_day()
+            open_days.add(d)
+            return done
+        
+        nodes += 1
+        if nodes > node_limit or (deadline is not None and time.monotonic() > deadline):
+            limit_hit = True
+            return False
+        
+        # Totals the rest of this day's grants could still fill, counting only
+        # amounts that leave each of them able to finish on later days
+        day_reach = 1
+        if day_exact:
+            later_options = [block_options(j, d, day_left, later_reach) for j in order[k + 1:]]
+            day_reach = reachable_totals(later_options, day_left)
+        
+        g = order[k]
+        candidates = block_options(g, d, day_left, later_reach)
+        if day_exact:
+            candidates = [v for v in candidates if (day_reach >> (day_left - v)) & 1]
+        if fixed[g][d] is None:
+            target = preferred_amount(g, d)
+            candidates.sort(key=lambda v: (abs(v - target), rng.random()))
+        
+        for amount in candidates:
+            allocation[g][d] = amount
+            remaining[g] -= amount
+            if fill_day(d, order, k + 1, day_left - amount, later_reach):
+                return True
+            remaining[g] += amount
+            allocation[g][d] = 0
+            
+            if limit_hit:
+                return False
+        
+        return False
+    
+    def next_day():
+        if not open_days:
+            return True
+        
+        state = (frozenset(open_days), tuple(remaining))
+        if state in failed_states:
+            return False
+        
+        # Every grant must still be able to finish on the open days
+        if grant_exact:
+            if sum(remaining) > len(open_days) * day_quarters:
+                return False
+            for g in range(num_grants):
+                if not (reach_over(g, open_days) >> remaining[g]) & 1:
+                    return False
+        
+        # ...or at least cover their pinned hours, and together fill every open day
+        else:
+            reach = [reach_over(g, open_days) for g in range(num_grants)]
+            if not all(reach):
+                return False
+            usable = sum(r.bit_length() - 1 for r in reach)
+            if day_exact and usable < len(open_days) * day_quarters:
+                return False
+        
+        # ...and, ignoring block sizes, all of them must fit the open days together
+        if not spread_fits():
+            return False
+        
+        # Fill the most constrained day next, while the other days still have slack
+        best_day = None
+        best_key = None
+        for d in open_days:
+            room = sum(day_room(g, d) for g in range(num_grants))
+            if day_exact and room < day_quarters:
+                return False
+            key = (room, rng.random())
+            if best_key is None or key < best_key:
+                best_day, best_key = d, key
+        d = best_day
+        
+        other_days = open_days - {d}
+        later_reach = [reach_over(g, other_days) for g in range(num_grants)]
+        
+        # Pinned cells first, then the grants with the fewest open days
+        pinned = [g for g in range(num_grants) if fixed[g][d] is not None]
+        free = [g for g in range(num_grants) if fixed[g][d] is None and caps[g][d] > 0 and remaining[g] > 0]
+        rng.shuffle(free)
+        free.sort(key=lambda g: sum(1 for dd in open_days if caps[g][dd] > 0))
+        
+        if fill_day(d, pinned + free, 0, day_quarters, later_reach):
+            return True
+        if not limit_hit:
+            failed_states.add(state)
+        return False
+    
+    if next_day():
+        return allocation
+    if limit_hit:
+        return None
+    raise ValueError("No schedule satisfies all of the grant constraints")
+
+def allocate_constrained_hours(grants_data, time_limit=5.0, seed=None, warm_start=None):
+    grants = normalize_grant_hours(grants_data)
+    constraints = build_grant_constraints(grants_data)
+    rng = random.Random(seed)
+    
+    all_days = [(week, day) for week in [1, 2] for day in WORKDAYS]
+    day_quarters = 32
+    
+    targets = [round(hours * 4) for _, hours in grants]
+    total = sum(targets)
+    capacity = len(all_days) * day_quarters
+    
+    # At exactly 80 hours both grants and days are filled exactly. Below 80 every
+    # grant is used in full and days may be short; above 80 every day is full
+    # and grants may be left with remaining hours.
+    grant_exact = total <= capacity
+    day_exact = total >= capacity
+    
+    caps = [[0] * len(all_days) for _ in grants]
+    fixed = [[None] * len(all_days) for _ in grants]
+    for i, c in enumerate(constraints):
+        for d, (week, day) in enumerate(all_days):
+            if day in c["pinned"]:
+                caps[i][d] = fixed[i][d] = c["pinned"][day]
+            elif day in c["days"]:
+                caps[i][d] = c["max"]
+    
+    # Catch the common mistakes up front so the error names the grant
+    for i, (name, hours) in enumerate(grants):
+        if sum(fixed[i][d] or 0 for d in range(len(all_days))) > targets[i]:
+            raise ValueError(f"{name}: pinned hours add up to more than its {hours:.2f} maximum hours")
+        if grant_exact and sum(caps[i]) < targets[i]:
+            raise ValueError(
+                f"{name}: needs {hours:.2f} hours but its day restrictions allow at most {sum(caps[i]) / 4:.2f}"
+            )
+    for d, (week, day) in enumerate(all_days):
+        if sum(fixed[i][d] or 0 for i in range(len(grants))) > day_quarters:
+            raise ValueError(f"Pinned hours on {day} of Week {week} add up to more than 8 hours")
+    
+    minimums = [c["min"] for c in constraints]
+    if grant_exact:
+        for i, (name, hours) in enumerate(grants):
+            options_by_day = [block_amounts(caps[i][d], minimums[i], fixed[i][d]) for d in range(len(all_days))]
+            if not (reachable_totals(options_by_day, targets[i]) >> targets[i]) & 1:
+                raise ValueError(
+                    f"{name}: {hours:.2f} hours can't be split into daily blocks that meet its minimum and pinned hours"
+                )
+    
+    # Scale each grant's warm start layout to this period's hours
+    preferred = None
+    if warm_start:
+        preferred = []
+        for i, (name, hours) in enumerate(grants):
+            pattern = warm_start.get(name)
+            pattern_total = sum(pattern) if pattern else 0
+            if pattern_total > 0:
+                preferred.append([amount * targets[i] / pattern_total for amount in pattern])
+            else:
+                preferred.append(None)
+    
+    # Randomized restarts: search times are heavy-tailed, so cut each attempt
+    # short and let the node limit grow until one lands or time runs out.
+    # Dead states are proven regardless of order, so every attempt shares them.
+    deadline = time.monotonic() + time_limit
+    failed_states = set()
+    node_limit = 100
+    allocation = None
+    while allocation is None and time.monotonic() < deadline:
+        allocation = solve_allocation(
+            targets, caps, minimums, fixed, grant_exact, day_exact, rng, node_limit=int(node_limit),
+            preferred=preferred, deadline=deadline, failed_states=failed_states
+        )
+        node_limit *= 1.5
+    if allocation is None:
+        raise ValueError(
+            f"Could not find a schedule that satisfies all of the grant constraints within {time_limit:g} seconds"
+        )
+    
+    # Convert back to the schedule structure used everywhere else
+    schedule = {week: {day: [0.0 for _ in grants] for day in WORKDAYS} for week in [1, 2]}
+    for i in range(len(grants)):
+        for d, (week, day) in enumerate(all_days):
+            schedule[week][day][i] = allocation[i][d] / 4
+    
+    return schedule, grants
+
+def create_schedule_dataframe(schedule, grants):
+    # Create a list to store all records
+    records = []
+    
+    # Process each week, day, and grant
+    for week in [1, 2]:
+        for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]:
+            for i, (name, _) in enumerate(grants):
+                if schedule[week][day][i] > 0:
+                    records.append({
+                        "Week": week,
+                        "Day": day,
+                        "Grant": name,
+                        "Hours": schedule[week][day][i]
+                    })
+    
+    # Convert to DataFrame
+    return pd.DataFrame(records)
+
+def create_summary_dataframe(schedule, grants):
+    # Create a list to store summary records
+    records = []
+    
+    # Calculate totals for each grant
+    for i, (name, max_hrs) in enumerate(grants):
+        week1_total = sum(schedule[1][day][i] for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"])
+        week2_total = sum(schedule[2][day][i] for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"])
+        total = week1_total + week2_total
+        
+        # Calculate the remaining hours (allowed to be under but not over)
+        remaining = max_hrs - total
+        
+        records.append({
+            "Grant": name,
+            "Week 1 Hours": week1_total,
+            "Week 2 Hours": week2_total,
+            "Total Hours": total,
+            "Maximum Hours": max_hrs,
+            "Remaining Hours": remaining
+        })
+    
+    # Convert to DataFrame
+    return pd.DataFrame(records)
+
+def build_pattern_index(sources, default_employee="Default", chunksize=10000, recency_weight=0.6):
+    """Build a per-employee pattern index from historical schedule CSVs.
+    
+    sources are paths or file objects in the create_schedule_dataframe format,
+    oldest first, one pay period each. An optional Employee column lets one file
+    hold a whole roster; otherwise rows belong to default_employee. Files are
+    read in chunks, and older periods fade by recency_weight so the index stays
+    close to the latest layout. Returns hours indexed by (Employee, Grant) with
+    one column per day of the two weeks.
+    """
+    slot_labels = [f"Week {week} {day}" for week in [1, 2] for day in WORKDAYS]
+    index = None
+    
+    for source in sources:
+        # Total up this period one chunk at a time
+        period = None
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            missing = {"Week", "Day", "Grant", "Hours"} - set(chunk.columns)
+            if missing:
+                raise ValueError(f"Schedule CSV is missing columns: {', '.join(sorted(missing))}")
+            
+            if "Employee" not in chunk.columns:
+                chunk["Employee"] = default_employee
+            
+            # Accept "1.0" weeks and any capitalisation of day names, but refuse
+            # rows that fit no slot rather than dropping them quietly
+            week = pd.to_numeric(chunk["Week"], errors="coerce")
+            day = chunk["Day"].astype(str).str.strip().str.capitalize()
+            unmatched = ~(week.isin([1, 2]) & day.isin(WORKDAYS))
+            if unmatched.any():
+                row = unmatched.idxmax()
+                cells = ["" if is_blank(chunk.at[row, column]) else chunk.at[row, column] for column in ["Week", "Day"]]
+                raise ValueError(
+                    f"Schedule CSV line {row + 2} has Week '{cells[0]}' and Day '{cells[1]}'; "
+                    "expected Week 1 or 2 and Monday through Friday"
+                )
+            chunk["Slot"] = "Week " + week.astype(int).astype(str) + " " + day
+            chunk["Hours"] = pd.to_numeric(chunk["Hours"], errors="coerce").fillna(0.0)
+            
+            # Give every chunk all ten day columns; add() leaves NaN where a row
+            # and a column are both missing from one side
+            totals = chunk.pivot_table(
+                index=["Employee", "Grant"], columns="Slot", values="Hours", aggfunc="sum", fill_value=0.0
+            ).reindex(columns=slot_labels, fill_value=0.0)
+            period = totals if period is None else period.add(totals, fill_value=0.0)
+        
+        if period is None:
+            continue
+        
+        if index is None:
+            index = period
+            continue
+        
+        # Blend returning employees towards this period; new employees start from it
+        period_employees = period.index.get_level_values("Employee")
+        known_employees = index.index.get_level_values("Employee")
+        returning = period_employees.isin(known_employees)
+        in_period = known_employees.isin(period_employees)
+        blended = (index[in_period] * (1 - recency_weight)).add(period[returning] * recency_weight, fill_value=0.0)
+        index = pd.concat([index[~in_period], blended, period[~returning]])
+    
+    if index is None:
+        return pd.DataFrame(
+            columns=slot_labels,
+            index=pd.MultiIndex.from_arrays([[], []], names=["Employee", "Grant"]),
+            dtype="float32"
+        )
+    
+    # Keep the index small: single precision and no faded-out rows
+    index = index[index.sum(axis=1) > 0.01].astype("float32").sort_index()
+    index.columns.name = None
+    return index
+
+def pattern_for_employee(pattern_index, employee):
+    """Return one employee's {grant: hours per day} warm start from a pattern index"""
+    if employee not in pattern_index.index.get_level_values("Employee"):
+        return {}
+    rows = pattern_index.xs(employee, level="Employee")
+    return {grant: [float(hours) for hours in values] for grant, values in zip(rows.index, rows.to_numpy())}
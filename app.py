@@ -1,9 +1,18 @@
-import random
 import streamlit as st
 import pandas as pd
 import base64
 from io import BytesIO
 
+from allocation import (
+    CONSTRAINT_COLUMNS,
+    GRANT_COLUMNS,
+    allocate_hours,
+    build_pattern_index,
+    create_schedule_dataframe,
+    create_summary_dataframe,
+    pattern_for_employee
+)
+
 st.set_page_config(page_title="Grant Hour Allocation Tool", layout="wide")
 
 # Define the list of available grants in the specified order
@@ -25,369 +34,39 @@ AVAILABLE_GRANTS = [
     "Non-Grant"
 ]
 
-def allocate_hours(grants_data):
-    # Convert dataframe to list of tuples and normalize to exact 0.25 hour increments
-    grants_list = []
-    total_original = 0
-    
-    for _, row in grants_data.iterrows():
-        name = row["Grant Name"]
-        # Round to nearest 0.25 to avoid floating point issues
-        original_hours = row["Maximum Hours"]
-        max_hours = round(original_hours * 4) / 4
-        grants_list.append((name, max_hours, original_hours))
-        total_original += original_hours
-    
-    # Adjust for any rounding discrepancies to ensure exactly 80 hours
-    total_after_rounding = sum(max_hours for _, max_hours, _ in grants_list)
-    
-    # If we're close to 80 hours but not exactly due to rounding,
-    # adjust the largest grant to make the total exactly 80
-    if abs(total_original - 80.0) < 0.1 and abs(total_after_rounding - 80.0) > 0.01:
-        # Find the largest grant
-        largest_idx = max(range(len(grants_list)), key=lambda i: grants_list[i][1])
-        name, hours, original = grants_list[largest_idx]
-        
-        # Adjust it to make the total exactly 80
-        adjusted_hours = hours + (80.0 - total_after_rounding)
-        # Still ensure it's in 0.25 increments
-        adjusted_hours = round(adjusted_hours * 4) / 4
-        
-        # Replace with adjusted value
-        grants_list[largest_idx] = (name, adjusted_hours, original)
-    
-    # Convert to the expected format for the algorithm
-    grants = [(name, hours) for name, hours, _ in grants_list]
-    
-    # Define workdays
-    workdays = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-    
-    # Create a 2-week schedule structure
-    schedule = {
-        1: {day: [0.0 for _ in grants] for day in workdays},
-        2: {day: [0.0 for _ in grants] for day in workdays}
-    }
-    
-    # Get total hours for each day (8 hours)
-    day_total_target = 8.0
-    
-    # Track daily allocated hours
-    day_allocated = {week: {day: 0.0 for day in workdays} for week in [1, 2]}
-    
-    # Track allocated hours for each grant
-    grant_allocated = [0.0 for _ in grants]
-    
-    # Calculate total available hours across all grants after adjustments
-    total_available_hours = sum(max_hours for _, max_hours in grants)
-    
-    # Create a list of all days
-    all_days = [(week, day) for week in [1, 2] for day in workdays]
-    
-    # Check if we have exactly 80 hours (should be exact now)
-    is_80_hour_case = abs(total_available_hours - 80.0) < 0.01
-    
-    if is_80_hour_case:
-        # First, let's fill each day exactly to 8 hours
-        
-        # Shuffle days to randomize allocation
-        random.shuffle(all_days)
-        
-        # Approach: Fill all days to exactly 8 hours using a greedy algorithm
-        
-        # Sort grants by size (largest first) to prioritize allocation
-        sorted_grants = sorted(enumerate(grants), key=lambda x: x[1][1], reverse=True)
-        
-        # Track remaining hours for each grant
-        remaining_hours = [hours for _, hours in grants]
-        
-        # Step 1: Try to fill each day with larger chunks first
-        for week, day in all_days:
-            # Reset day's allocated hours
-            day_allocated[week][day] = 0
-            for i in range(len(grants)):
-                schedule[week][day][i] = 0
-            
-            # Available hours for this day
-            available = 8.0
-            
-            # Try to allocate larger chunks first
-            possible_chunks = [8.0, 4.0, 2.0, 1.5, 1.0, 0.75, 0.5, 0.25]
-            
-            # Randomize the order of grants for this day
-            day_grants = list(sorted_grants)
-            random.shuffle(day_grants)
-            
-            # Try each chunk size
-            for chunk in possible_chunks:
-                if chunk > available or chunk < 0.25:
-                    continue
-                
-                # Try to find grants that can use this chunk size
-                for idx, (i, (name, _)) in enumerate(day_grants):
-                    if remaining_hours[i] >= chunk:
-                        # Allocate this chunk
-                        schedule[week][day][i] += chunk
-                        day_allocated[week][day] += chunk
-                        remaining_hours[i] -= chunk
-                        available -= chunk
-                        
-                        # If this grant is now fully allocated, remove it
-                        if remaining_hours[i] < 0.25:
-                            day_grants.pop(idx)
-                        
-                        # If the day is full, break
-                        if available < 0.25:
-                            break
-                        
-                        # If more of this chunk can be allocated, try again
-                        if available >= chunk:
-                            continue
-                
-                # If the day is full, break
-                if available < 0.25:
-                    break
-            
-            # If we still have space, fill with remaining hours
-            if available >= 0.25:
-                # Use any grant with remaining hours
-                for idx, (i, (name, _)) in enumerate(day_grants):
-                    if remaining_hours[i] >= 0.25:
-                        # Calculate how much to allocate
-                        allocation = min(remaining_hours[i], available)
-                        allocation = round(allocation * 4) / 4  # Round to nearest 0.25
-                        
-                        if allocation >= 0.25:
-                            schedule[week][day][i] += allocation
-                            day_allocated[week][day] += allocation
-                            remaining_hours[i] -= allocation
-                            available -= allocation
-                        
-                        # If this grant is now fully allocated, remove it
-                        if remaining_hours[i] < 0.25:
-                            day_grants.pop(idx)
-                        
-                        # If the day is full, break
-                        if available < 0.25:
-                            break
-        
-        # Step 2: After initial allocation, verify and adjust
-        # Calculate actual allocated hours
-        for i in range(len(grants)):
-            grant_allocated[i] = sum(schedule[week][day][i] for week in [1, 2] for day in workdays)
-        
-        # Check if any grants are under-allocated
-        for i, (name, max_hours) in enumerate(grants):
-            if abs(grant_allocated[i] - max_hours) > 0.01:
-                # Find how much is still needed
-                needed = max_hours - grant_allocated[i]
-                
-                if needed > 0:
-                    # Find days that can accommodate more hours
-                    for week in [1, 2]:
-                        for day in workdays:
-                            # Check if this day has room
-                            day_total = sum(schedule[week][day])
-                            if day_total < 8.0 - 0.01:
-                                # Calculate how much to add
-                                available = 8.0 - day_total
-                                allocation = min(needed, available)
-                                allocation = round(allocation * 4) / 4  # Round to nearest 0.25
-                                
-                                if allocation >= 0.25:
-                                    schedule[week][day][i] += allocation
-                                    grant_allocated[i] += allocation
-                                    needed -= allocation
-                                
-                                # If we've allocated all needed hours, break
-                                if needed < 0.01:
-                                    break
-                        
-                        # If we've allocated all needed hours, break
-                        if needed < 0.01:
-                            break
-                
-                elif needed < 0:
-                    # We've over-allocated - reduce allocation
-                    excess = -needed
-                    
-                    for week in [1, 2]:
-                        for day in workdays:
-                            if schedule[week][day][i] > 0:
-                                reduction = min(excess, schedule[week][day][i])
-                                reduction = round(reduction * 4) / 4  # Round to nearest 0.25
-                                
-                                schedule[week][day][i] -= reduction
-                                grant_allocated[i] -= reduction
-                                excess -= reduction
-                                
-                                # If we've fixed the excess, break
-                                if excess < 0.01:
-                                    break
-                        
-                        # If we've fixed the excess, break
-                        if excess < 0.01:
-                            break
-        
-        # Step 3: Final check - ensure each day has exactly 8 hours
-        for week in [1, 2]:
-            for day in workdays:
-                day_total = sum(schedule[week][day])
-                
-                # If day is not exactly 8 hours (considering precision issues)
-                if abs(day_total - 8.0) > 0.01:
-                    # Adjust by adding or removing hours
-                    if day_total < 8.0:  # Need to add hours
-                        shortage = 8.0 - day_total
-                        # Try to find a grant with remaining hours
-                        for i, (name, max_hours) in enumerate(grants):
-                            if grant_allocated[i] < max_hours - 0.01:
-                                to_add = min(shortage, max_hours - grant_allocated[i])
-                                to_add = round(to_add * 4) / 4  # Round to nearest 0.25
-                                
-                                if to_add >= 0.25:
-                                    schedule[week][day][i] += to_add
-                                    grant_allocated[i] += to_add
-                                    shortage -= to_add
-                                
-                                if shortage < 0.01:
-                                    break
-                    else:  # Need to remove hours
-                        excess = day_total - 8.0
-                        # Find a grant with hours allocated on this day
-                        for i in range(len(grants)):
-                            if schedule[week][day][i] > 0:
-                                to_remove = min(excess, schedule[week][day][i])
-                                to_remove = round(to_remove * 4) / 4  # Round to nearest 0.25
-                                
-                                if to_remove >= 0.25:
-                                    schedule[week][day][i] -= to_remove
-                                    grant_allocated[i] -= to_remove
-                                    excess -= to_remove
-                                
-                                if excess < 0.01:
-                                    break
-    else:
-        # For non-80-hour cases, use a simpler distribution approach
-        # Shuffle days for randomization
-        random.shuffle(all_days)
-        
-        # Sort grants from largest to smallest
-        sorted_grants = sorted(enumerate(grants), key=lambda x: x[1][1], reverse=True)
-        
-        # Allocate each grant
-        for i, (name, max_hours) in sorted_grants:
-            if max_hours <= 0.0:
-                continue
-                
-            remaining = max_hours
-            days_to_use = all_days.copy()
-            random.shuffle(days_to_use)
-            
-            # Create varied chunks for more random allocation patterns
-            standard_chunks = [4.0, 3.75, 3.5, 3.25, 3.0, 2.75, 2.5, 2.25, 2.0, 1.75, 1.5, 1.25, 1.0, 0.75, 0.5, 0.25]
-            # Use a random subset for this particular grant
-            num_chunks = random.randint(4, 10)
-            varied_chunks = random.sample(standard_chunks, min(num_chunks, len(standard_chunks)))
-            varied_chunks.sort(reverse=True)
-            
-            while remaining > 0.01 and days_to_use:
-                week, day = days_to_use.pop(0)
-                available = day_total_target - day_allocated[week][day]
-                
-                if available < 0.25:
-                    continue
-                
-                allocation = None
-                # Decide whether to use a standard chunk or a more creative allocation
-                if random.random() < 0.7:  # 70% chance to use varied chunks
-                    # Find a suitable chunk from our varied set
-                    for chunk in varied_chunks:
-                        if chunk <= available and chunk <= remaining:
-                            allocation = chunk
-                            break
-                
-                # If no allocation yet or we're using creative allocation (30% chance)
-                if allocation is None or random.random() < 0.3:
-                    # Use a random allocation for more variety
-                    max_alloc = min(available, remaining)
-                    # Choose a random value between 0.25 and the maximum available
-                    allocation = 0.25 + (random.random() * (max_alloc - 0.25))
-                    allocation = round(allocation * 4) / 4  # Round to nearest 0.25
-                else:
-                    allocation = min(remaining, available)
-                    # Round to nearest 0.25
-                    allocation = round(allocation * 4) / 4
-                
-                if allocation >= 0.25:
-                    schedule[week][day][i] += allocation
-                    day_allocated[week][day] += allocation
-                    grant_allocated[i] += allocation
-                    remaining = max_hours - grant_allocated[i]
-    
-    # Final verification - make sure we haven't exceeded any grant maximums
-    for i, (name, max_hours) in enumerate(grants):
-        total = sum(schedule[week][day][i] for week in [1, 2] for day in workdays)
-        if total > max_hours + 0.01:
-            # This shouldn't happen with the logic above, but just in case
-            excess = total - max_hours
-            for week in [1, 2]:
-                for day in workdays:
-                    if schedule[week][day][i] > 0 and excess > 0.01:
-                        reduction = min(excess, schedule[week][day][i])
-                        schedule[week][day][i] -= reduction
-                        day_allocated[week][day] -= reduction
-                        excess -= reduction
-    
-    return schedule, grants
-
-def create_schedule_dataframe(schedule, grants):
-    # Create a list to store all records
-    records = []
-    
-    # Process each week, day, and grant
-    for week in [1, 2]:
-        for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]:
-            for i, (name, _) in enumerate(grants):
-                if schedule[week][day][i] > 0:
-                    records.append({
-                        "Week": week,
-                        "Day": day,
-                        "Grant": name,
-                        "Hours": schedule[week][day][i]
-                    })
-    
-    # Convert to DataFrame
-    return pd.DataFrame(records)
-
-def create_summary_dataframe(schedule, grants):
-    # Create a list to store summary records
-    records = []
-    
-    # Calculate totals for each grant
-    for i, (name, max_hrs) in enumerate(grants):
-        week1_total = sum(schedule[1][day][i] for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"])
-        week2_total = sum(schedule[2][day][i] for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"])
-        total = week1_total + week2_total
-        
-        # Calculate the remaining hours (allowed to be under but not over)
-        remaining = max_hrs - total
-        
-        records.append({
-            "Grant": name,
-            "Week 1 Hours": week1_total,
-            "Week 2 Hours": week2_total,
-            "Total Hours": total,
-            "Maximum Hours": max_hrs,
-            "Remaining Hours": remaining
-        })
-    
-    # Convert to DataFrame
-    return pd.DataFrame(records)
-
 def export_to_csv(df):
     """Convert dataframe to CSV format for downloading"""
     return df.to_csv(index=False).encode("utf-8")
 
+@st.cache_data(show_spinner=False)
+def load_pattern_index(files):
+    """Build (and cache) the pattern index for uploaded (name, bytes) files"""
+    return build_pattern_index(BytesIO(data) for _, data in files)
+
+def apply_grant_edits(edited_df):
+    """Build the new grants dataframe from a submitted data editor batch"""
+    # Drop every row flagged for deletion in one pass
+    kept = edited_df[~edited_df["Delete"].fillna(False).astype(bool)]
+
+    # Invalid or cleared cells fall back to 0 hours
+    hours = pd.to_numeric(kept["Maximum Hours"], errors="coerce").fillna(0.0)
+
+    grants_data = pd.DataFrame({
+        "Grant Name": kept["Grant Name"].to_numpy(),
+        "Maximum Hours": hours.to_numpy(dtype=float)
+    })
+
+    # Cleared constraint cells mean "no rule"
+    for column in CONSTRAINT_COLUMNS:
+        if column not in kept.columns:
+            continue
+        if column in ("Min Daily Hours", "Max Daily Hours"):
+            grants_data[column] = pd.to_numeric(kept[column], errors="coerce").to_numpy(dtype=float)
+        else:
+            grants_data[column] = kept[column].fillna("").astype(str).str.strip().to_numpy()
+
+    return grants_data
+
 def main():
     st.title("Grant Hour Allocation Tool")
     
@@ -398,7 +77,7 @@ def main():
     
     # Initialize session state
     if 'grants_data' not in st.session_state:
-        st.session_state.grants_data = pd.DataFrame(columns=["Grant Name", "Maximum Hours"])
+        st.session_state.grants_data = pd.DataFrame(columns=GRANT_COLUMNS)
     
     # Main two-column layout
     col1, col2 = st.columns([1, 1])
@@ -426,7 +105,11 @@ def main():
                     default_hours = 0.0
                     new_data = pd.DataFrame({
                         "Grant Name": [grant], 
-                        "Maximum Hours": [default_hours]
+                        "Maximum Hours": [default_hours],
+                        "Allowed Days": [""],
+                        "Min Daily Hours": [None],
+                        "Max Daily Hours": [None],
+                        "Pinned Hours": [""]
                     })
                     st.session_state.grants_data = pd.concat([st.session_state.grants_data, new_data], ignore_index=True)
                     st.rerun()
@@ -448,12 +131,46 @@ def main():
             else:
                 st.info("Note: For exact 8-hour days, set total maximum hours to exactly 80.")
         
+        # Optionally start from the layout of previous pay periods
+        with st.expander("Warm Start from Previous Schedules"):
+            uploaded = st.file_uploader(
+                "Schedule Details CSVs from earlier periods (oldest first)",
+                type="csv",
+                accept_multiple_files=True
+            )
+            st.session_state.warm_start = None
+            if uploaded:
+                try:
+                    pattern_index = load_pattern_index(tuple((f.name, f.getvalue()) for f in uploaded))
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    employees = list(pattern_index.index.get_level_values("Employee").unique())
+                    if len(employees) > 1:
+                        employee = st.selectbox("Employee", employees)
+                    elif employees:
+                        employee = employees[0]
+                    else:
+                        employee = None
+                    
+                    if employee is not None:
+                        st.session_state.warm_start = pattern_for_employee(pattern_index, employee)
+                        st.caption(f"New schedules will follow the pattern from {len(uploaded)} previous period(s).")
+        
         if st.button("Generate Schedule", type="primary", use_container_width=True):
             if not st.session_state.grants_data.empty:
                 with st.spinner("Generating..."):
-                    # Generate schedule
-                    schedule, grants = allocate_hours(st.session_state.grants_data)
-                    
+                    # Constraint problems are reported instead of breaking the page
+                    try:
+                        schedule, grants = allocate_hours(
+                            st.session_state.grants_data,
+                            warm_start=st.session_state.get("warm_start")
+                        )
+                    except ValueError as e:
+                        st.error(f"Could not generate a schedule: {e}")
+                        schedule = None
+                
+                if schedule is not None:
                     # Convert to DataFrames
                     st.session_state.schedule_df = create_schedule_dataframe(schedule, grants)
                     st.session_state.summary_df = create_summary_dataframe(schedule, grants)
@@ -541,58 +258,49 @@ def main():
                     del st.session_state.summary_df
                 st.rerun()
             
-            # Track if we need to update the dataframe
-            update_needed = False
+            # Edit all selected grants in one batch; the form holds back reruns
+            # until the changes are submitted
+            editor_df = st.session_state.grants_data.reindex(columns=GRANT_COLUMNS).astype({
+                "Maximum Hours": float,
+                "Min Daily Hours": float,
+                "Max Daily Hours": float
+            })
+            editor_df[["Allowed Days", "Pinned Hours"]] = editor_df[["Allowed Days", "Pinned Hours"]].fillna("")
+            editor_df["Delete"] = False
             
-            # Create a custom display for selected grants with inline edit and delete buttons
-            for idx, row in st.session_state.grants_data.iterrows():
-                # Create a row with columns for grant name, hours input, and delete button
-                col_name, col_hours, col_delete = st.columns([2, 1, 1])
-                
-                with col_name:
-                    st.write(row["Grant Name"])
-                
-                with col_hours:
-                    # Create a unique key for each input
-                    input_key = f"edit_hours_{row['Grant Name']}_{idx}"
-                    
-                    # Check if there's an existing value in session state
-                    current_value = st.session_state.get(input_key, str(row['Maximum Hours']))
-                    
-                    # Create text input for editing hours
-                    new_hours_str = st.text_input(
-                        "Hours",
-                        value=current_value,
-                        label_visibility="collapsed",
-                        key=input_key
-                    )
-                    
-                    # If value changed, update the dataframe
-                    try:
-                        new_hours = float(new_hours_str)
-                        if new_hours != row['Maximum Hours']:
-                            st.session_state.grants_data.at[idx, 'Maximum Hours'] = new_hours
-                            update_needed = True
-                    except ValueError:
-                        st.error(f"Invalid number for {row['Grant Name']}")
-                
-                with col_delete:
-                    if st.button("Delete", key=f"inline_del_{row['Grant Name']}", use_container_width=True):
-                        st.session_state.grants_data = st.session_state.grants_data.drop(idx).reset_index(drop=True)
-                        st.rerun()
-                
-                # Add a light divider between grants
-                st.markdown('<hr style="margin: 0.25em 0; border: 0; border-top: 1px solid #eee;">', unsafe_allow_html=True)
+            with st.form("selected_grants_form"):
+                edited_df = st.data_editor(
+                    editor_df,
+                    column_config={
+                        "Grant Name": st.column_config.TextColumn("Grant Name", disabled=True),
+                        "Maximum Hours": st.column_config.NumberColumn("Hours", min_value=0.0, step=0.25, format="%.2f"),
+                        "Allowed Days": st.column_config.TextColumn("Allowed Days", help="Blank for any day, e.g. 'Tue, Thu'"),
+                        "Min Daily Hours": st.column_config.NumberColumn("Min/Day", min_value=0.0, max_value=8.0, step=0.25, format="%.2f"),
+                        "Max Daily Hours": st.column_config.NumberColumn("Max/Day", min_value=0.0, max_value=8.0, step=0.25, format="%.2f"),
+                        "Pinned Hours": st.column_config.TextColumn("Pinned Hours", help="Fixed hours on a day of both weeks, e.g. 'Fri=2'"),
+                        "Delete": st.column_config.CheckboxColumn("Delete"),
+                    },
+                    num_rows="fixed",
+                    use_container_width=True,
+                    hide_index=True
+                )
+                st.caption("Optional rules: Allowed Days limits which weekdays a grant is used, Min/Max per Day bound any day it is used, and Pinned Hours fixes hours on a weekday in both weeks.")
+                submitted = st.form_submit_button("Apply Changes", use_container_width=True)
             
-            # If we made changes to the dataframe, rerun to update everything
-            if update_needed and 'schedule_df' in st.session_state:
-                # Clear the schedule so it will be regenerated with new values
-                del st.session_state.schedule_df
-                del st.session_state.summary_df
+            if submitted:
+                new_grants_data = apply_grant_edits(edited_df)
+                
+                # Only invalidate the schedule if something actually changed
+                if not new_grants_data.equals(apply_grant_edits(editor_df)):
+                    st.session_state.grants_data = new_grants_data
+                    if 'schedule_df' in st.session_state:
+                        del st.session_state.schedule_df
+                        del st.session_state.summary_df
+                    st.rerun()
             
             # Clear all button
             if st.button("Clear All Grants", use_container_width=True):
-                st.session_state.grants_data = pd.DataFrame(columns=["Grant Name", "Maximum Hours"])
+                st.session_state.grants_data = pd.DataFrame(columns=GRANT_COLUMNS)
                 if 'schedule_df' in st.session_state:
                     del st.session_state.schedule_df
                     del st.session_state.summary_df
@@ -644,7 +352,7 @@ def main():
                     return ''
                 
                 # Apply styling
-                styled_df = st.session_state.summary_df.style.applymap(
+                styled_df = st.session_state.summary_df.style.map(
                     highlight_remaining, 
                     subset=['Remaining Hours']
                 )
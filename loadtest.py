@@ -0,0 +1,283 @@
+"""Headless load test for the Grant Hour Allocation Tool.
+
+Simulates N concurrent Streamlit sessions driving app.py through AppTest
+(add grants, submit hours through the batch editor, generate schedules) and
+reports per-action latency percentiles, peak RSS and per-session memory. An
+action's latency includes any st.rerun it triggers. Each session runs in its
+own process so memory figures are attributable to a single session.
+
+    python loadtest.py --sessions 8 --iterations 5
+"""
+import argparse
+import ast
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+from streamlit import __version__ as st_version
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.element_tree import ElementTree
+
+try:
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+except ImportError:
+    WidgetState = None
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# submit_hours relies on AppTest internals; this is the release it was written against
+TESTED_STREAMLIT_VERSION = "1.66"
+
+def missing_apptest_internals():
+    """List the AppTest internals submit_hours needs that this Streamlit lacks"""
+    missing = []
+    if WidgetState is None:
+        missing.append("streamlit.proto.WidgetStates_pb2.WidgetState")
+    if not callable(getattr(AppTest, "_run", None)):
+        missing.append("AppTest._run")
+    if not callable(getattr(ElementTree, "get_widget_states", None)):
+        missing.append("ElementTree.get_widget_states")
+    return missing
+
+def current_rss_mb():
+    """Read the current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        # Not on Linux - fall back to the peak value
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    """Read the peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+def _available_grants():
+    """Load the grant list without executing the Streamlit script"""
+    with open(APP_PATH) as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "AVAILABLE_GRANTS":
+            return ast.literal_eval(node.value)
+    raise LookupError("AVAILABLE_GRANTS not found in app.py")
+
+def session_state_bytes(at):
+    """Estimate the memory held by one session's state"""
+    total = 0
+    for _, value in at.session_state.items():
+        if isinstance(value, pd.DataFrame):
+            total += int(value.memory_usage(deep=True).sum())
+        else:
+            total += sys.getsizeof(value)
+    return total
+
+def random_hours(rng, num_grants):
+    """Split 80 hours across the grants in 0.25 hour increments"""
+    quarters = 80 * 4
+    cuts = sorted(rng.sample(range(1, quarters), num_grants - 1))
+    bounds = [0] + cuts + [quarters]
+    return [(bounds[i + 1] - bounds[i]) / 4 for i in range(num_grants)]
+
+def click(at, label):
+    """Click the first button with the given label and rerun"""
+    for button in at.button:
+        if button.label == label:
+            return button.click().run()
+    raise LookupError(f"No button labelled {label!r}")
+
+def submit_hours(at, hours):
+    """Type new hours into the Selected Grants editor and submit the form"""
+    # AppTest has no data editor API, so send the same edit delta the browser
+    # would alongside the submit click; the app then runs its real submit path.
+    # main() checks these internals exist before any session starts.
+    editor = next(df for df in at.dataframe if df.proto.id)
+    for button in at.button:
+        if button.label == "Apply Changes":
+            button.click()
+            break
+    else:
+        raise LookupError("No button labelled 'Apply Changes'")
+
+    widget_states = at._tree.get_widget_states()
+    edits = WidgetState(id=editor.proto.id)
+    edits.string_value = json.dumps({
+        "edited_rows": {str(row): {"Maximum Hours": value} for row, value in enumerate(hours)},
+        "added_rows": [],
+        "deleted_rows": []
+    })
+    widget_states.widgets.append(edits)
+    return at._run(widget_states)
+
+def run_session(session_id, args, barrier, queue):
+    """Drive one simulated user through the app in its own process"""
+    rng = random.Random(args.seed + session_id)
+    latencies = defaultdict(list)
+    errors = 0
+    first_error = None
+
+    def timed(action, step):
+        nonlocal errors, first_error
+        start = time.perf_counter()
+        at = step()
+        elapsed = time.perf_counter() - start
+
+        # A crashed rerun skips the rest of the script, so its time would
+        # flatter the action; count it as an error instead
+        if at.exception:
+            errors += len(at.exception)
+            if first_error is None:
+                exception = at.exception[0]
+                first_error = f"{action}: {exception.message}\n" + "\n".join(exception.stack_trace)
+        else:
+            latencies[action].append(elapsed)
+        return at
+
+    try:
+        # Warm up imports so the baseline excludes one-off module loading
+        AppTest.from_file(APP_PATH, default_timeout=args.timeout).run()
+        baseline_rss = current_rss_mb()
+
+        # Hold every session at the line until all of them are ready
+        barrier.wait()
+
+        at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+        at = timed("initial load", at.run)
+
+        # Add grants one click at a time, like a user working down the list
+        grants = rng.sample(_available_grants(), args.grants)
+        for grant in grants:
+            at = timed("add grant", at.button(key=f"add_{grant}").click().run)
+
+        for _ in range(args.iterations):
+            # Edit every grant's hours in one submit, as a user would in the form
+            hours = random_hours(rng, len(grants))
+            at = timed("edit hours", lambda: submit_hours(at, hours))
+            at = timed("generate schedule", lambda: click(at, "Generate Schedule"))
+
+        queue.put({
+            "session": session_id,
+            "latencies": dict(latencies),
+            "errors": errors,
+            "first_error": first_error,
+            "state_bytes": session_state_bytes(at),
+            "baseline_rss": baseline_rss,
+            "peak_rss": peak_rss_mb()
+        })
+    except Exception as e:
+        # Release the other sessions rather than leaving them at the barrier
+        barrier.abort()
+        queue.put({"session": session_id, "failure": f"{type(e).__name__}: {e}"})
+
+def percentile(values, pct):
+    """Return the given percentile using linear interpolation"""
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+def print_latency_row(label, values):
+    """Print one row of the latency table in milliseconds"""
+    print(
+        f"{label:<20}{len(values):>8}"
+        f"{percentile(values, 50) * 1000:>10.1f}"
+        f"{percentile(values, 90) * 1000:>10.1f}"
+        f"{percentile(values, 99) * 1000:>10.1f}"
+        f"{max(values) * 1000:>10.1f}"
+    )
+
+def print_report(results, elapsed):
+    """Print latency percentiles and memory figures"""
+    completed = [r for r in results if "failure" not in r]
+    failed = [r for r in results if "failure" in r]
+
+    latencies = defaultdict(list)
+    for result in completed:
+        for action, values in result["latencies"].items():
+            latencies[action].extend(values)
+
+    print(f"{'Action':<20}{'Runs':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    all_latencies = []
+    for action, values in latencies.items():
+        all_latencies.extend(values)
+        print_latency_row(action, values)
+    if all_latencies:
+        print_latency_row("all actions", all_latencies)
+        print(f"Throughput: {len(all_latencies) / elapsed:.1f} actions/s over {elapsed:.1f}s")
+
+    print()
+    if completed:
+        session_growth = [r["peak_rss"] - r["baseline_rss"] for r in completed]
+        state_sizes = [r["state_bytes"] for r in completed]
+        print(f"Baseline RSS:        {statistics.mean(r['baseline_rss'] for r in completed):.1f} MB per process")
+        print(f"Peak RSS:            {max(r['peak_rss'] for r in completed):.1f} MB max, {sum(r['peak_rss'] for r in completed):.1f} MB total")
+        print(f"Memory per session:  {statistics.mean(session_growth):.2f} MB avg, {max(session_growth):.2f} MB max")
+        print(f"Session state size:  {statistics.mean(state_sizes) / 1024:.1f} KB avg, {max(state_sizes) / 1024:.1f} KB max")
+        print(f"Script exceptions:   {sum(r['errors'] for r in completed)} (left out of the latencies)")
+    for result in failed:
+        print(f"Session {result['session']} failed: {result['failure']}")
+
+    first_errors = [r for r in completed if r["first_error"]]
+    if first_errors:
+        print()
+        print(f"First script exception, session {first_errors[0]['session']}:")
+        print(first_errors[0]["first_error"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the grant allocation app")
+    parser.add_argument("--sessions", type=int, default=4, help="number of concurrent simulated users")
+    parser.add_argument("--iterations", type=int, default=3, help="edit/generate cycles per session")
+    parser.add_argument("--grants", type=int, default=8, help="grants each user selects")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per script run")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for reproducible runs")
+    args = parser.parse_args()
+
+    if not 2 <= args.grants <= len(_available_grants()):
+        parser.error(f"--grants must be between 2 and {len(_available_grants())}")
+
+    missing = missing_apptest_internals()
+    if missing:
+        parser.error(
+            f"Streamlit {st_version} lacks the AppTest internals used to submit the grants "
+            f"editor ({', '.join(missing)}); the harness was tested with Streamlit {TESTED_STREAMLIT_VERSION}"
+        )
+
+    # AppTest shares a runtime singleton within a process, so each simulated
+    # session gets its own process and therefore its own RSS figures
+    barrier = multiprocessing.Barrier(args.sessions + 1)
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=run_session, args=(i, args, barrier, queue))
+        for i in range(args.sessions)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    start = time.perf_counter()
+    results = [queue.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    print_report(results, elapsed)
+    # Any failed session or script exception fails the run
+    passed = all("failure" not in r and not r["errors"] for r in results)
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""HTTP/JSON allocation service for the Grant Hour Allocation Tool.
+
+Lets payroll, HR and other systems request schedules without going through
+the Streamlit UI. Uses only the standard library on top of allocation.py.
+
+    python service.py --port 8080 --workers 4
+
+Endpoints:
+    POST /allocate        one allocation request
+    POST /allocate/batch  {"requests": [...]} - many allocation requests
+    GET  /metrics         throughput, latency and cache statistics
+    GET  /health          liveness check
+
+An allocation request looks like:
+    {
+        "grants": [
+            {"Grant Name": "ASA #3", "Maximum Hours": 40, "Max Daily Hours": 5},
+            {"Grant Name": "UHP #4", "Maximum Hours": 16, "Allowed Days": "Tue, Thu"},
+            {"Grant Name": "Non-Grant", "Maximum Hours": 24, "Pinned Hours": "Fri=4"}
+        ],
+        "warm_start": {"ASA #3": [4, 4, 4, 4, 4, 4, 4, 4, 4, 4]},
+        "seed": 7
+    }
+Grant fields use the same column names as the app. warm_start maps grant
+names to hours per day (Week 1 Monday through Week 2 Friday) and seed makes
+the result reproducible; both are optional. The response holds the schedule
+and summary rows in the same shape as the app's CSV downloads.
+
+A failed allocation returns {"error": ..., "status": ...} with status 400 for
+a problem with the request, 504 when it ran past --timeout and 500 for a
+fault in the service. /allocate answers with that status; /allocate/batch
+answers 200 and reports it per item. Each allocation gets at most
+--solve-time seconds, and batches are limited to what the workers can solve
+within --timeout at that rate.
+"""
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import statistics
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from allocation import (
+    GRANT_COLUMNS,
+    allocate_hours,
+    create_schedule_dataframe,
+    create_summary_dataframe
+)
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_BATCH_SIZE = 1000
+# Workers stop at the request deadline; this covers the last one finishing up
+POOL_GRACE_SECONDS = 5
+MAX_GRANTS = 50
+# Far more than any one pay period needs, but keeps a single request cheap
+MAX_GRANT_HOURS = 1000
+
+def is_number(value):
+    """Check for a finite JSON number (JSON allows Infinity and NaN literals)"""
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and math.isfinite(value)
+
+def validate_request(payload):
+    """Check an allocation request and return its grants dataframe"""
+    if not isinstance(payload, dict):
+        raise ValueError("Allocation request must be a JSON object")
+
+    grants = payload.get("grants")
+    if not isinstance(grants, list) or not grants:
+        raise ValueError("'grants' must be a non-empty list")
+    if len(grants) > MAX_GRANTS:
+        raise ValueError(f"At most {MAX_GRANTS} grants are allowed per request")
+
+    for grant in grants:
+        if not isinstance(grant, dict):
+            raise ValueError("Each grant must be a JSON object")
+        if not isinstance(grant.get("Grant Name"), str) or not grant["Grant Name"]:
+            raise ValueError("Each grant needs a 'Grant Name'")
+        hours = grant.get("Maximum Hours")
+        if not is_number(hours) or not 0 <= hours <= MAX_GRANT_HOURS:
+            raise ValueError(f"{grant['Grant Name']}: 'Maximum Hours' must be a number from 0 to {MAX_GRANT_HOURS}")
+        unknown = set(grant) - set(GRANT_COLUMNS)
+        if unknown:
+            raise ValueError(f"{grant['Grant Name']}: unknown fields {', '.join(sorted(unknown))}")
+        for field in ["Min Daily Hours", "Max Daily Hours"]:
+            value = grant.get(field)
+            if value is not None and (not is_number(value) or not 0 <= value <= 8):
+                raise ValueError(f"{grant['Grant Name']}: '{field}' must be a number from 0 to 8")
+        for field in ["Allowed Days", "Pinned Hours"]:
+            value = grant.get(field)
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{grant['Grant Name']}: '{field}' must be a string")
+
+    names = [grant["Grant Name"] for grant in grants]
+    if len(set(names)) != len(names):
+        raise ValueError("Grant names must be unique")
+
+    warm_start = payload.get("warm_start")
+    if warm_start is not None:
+        if not isinstance(warm_start, dict):
+            raise ValueError("'warm_start' must map grant names to 10 daily hours")
+        for name, pattern in warm_start.items():
+            if not isinstance(pattern, list) or len(pattern) != 10:
+                raise ValueError(f"warm_start for {name} must list hours for all 10 days")
+            if not all(is_number(hours) and 0 <= hours <= 8 for hours in pattern):
+                raise ValueError(f"warm_start for {name} must use hours from 0 to 8")
+
+    seed = payload.get("seed")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+        raise ValueError("'seed' must be an integer")
+
+    return pd.DataFrame(grants).reindex(columns=GRANT_COLUMNS)
+
+def run_allocation(payload, deadline=None, solve_time=5.0):
+    """Allocate one request; runs inside a pool worker.
+
+    deadline is a time.time() value. Work queued behind a timed-out request
+    is skipped once it passes, so the pool frees up instead of finishing
+    results nobody is waiting for.
+    """
+    # Failures come back as this request's result; raising here would fail
+    # the whole pool call, and with it every other request in the batch
+    timed_out = {"error": "Allocation timed out", "status": 504}
+    try:
+        if deadline is not None and time.time() >= deadline:
+            return timed_out
+        grants_data = validate_request(payload)
+        time_limit = solve_time if deadline is None else min(solve_time, deadline - time.time())
+        schedule, grants = allocate_hours(
+            grants_data, warm_start=payload.get("warm_start"), seed=payload.get("seed"), time_limit=time_limit
+        )
+
+        return {
+            "schedule": create_schedule_dataframe(schedule, grants).to_dict("records"),
+            "summary": create_summary_dataframe(schedule, grants).to_dict("records")
+        }
+    except ValueError as e:
+        # The solver gives up with a ValueError when its time runs out
+        if deadline is not None and time.time() >= deadline:
+            return timed_out
+        return {"error": str(e), "status": 400}
+    except Exception:
+        # A bug, not a bad request: keep the details in the server log
+        traceback.print_exc()
+        return {"error": "Internal error", "status": 500}
+
+def percentile(values, pct):
+    """Return the given percentile using linear interpolation"""
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+def request_key(payload):
+    """Hash a request so identical inputs share a cache entry"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class AllocationService:
+    """Worker pool, result cache and metrics shared by all request threads"""
+
+    def __init__(self, workers, cache_size, timeout, solve_time=1.0):
+        # Fork the workers up front so requests never wait on process start-up
+        self.pool = multiprocessing.Pool(processes=workers)
+        self.workers = workers
+        self.timeout = timeout
+        self.solve_time = solve_time
+        # Only accept batches the workers could finish in time even if every
+        # allocation used its whole solve time
+        self.max_batch_size = max(1, min(MAX_BATCH_SIZE, int(workers * timeout / solve_time)))
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.started = time.time()
+        self.counts = {
+            "requests": 0, "allocations": 0, "computed": 0, "cache_hits": 0, "cache_misses": 0,
+            "client_errors": 0, "internal_errors": 0, "timeouts": 0
+        }
+        self.latencies = deque(maxlen=10000)
+
+    def cached(self, key):
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.counts["cache_hits"] += 1
+                return self.cache[key]
+            self.counts["cache_misses"] += 1
+            return None
+
+    def store(self, key, result):
+        # Errors are cheap to recompute and shouldn't crowd out real schedules
+        if self.cache_size <= 0 or "error" in result:
+            return
+        with self.lock:
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def allocate_many(self, payloads):
+        """Allocate a list of requests, answering repeats from the cache"""
+        if len(payloads) > self.max_batch_size:
+            raise ValueError(f"At most {self.max_batch_size} requests are allowed per batch")
+
+        deadline = time.time() + self.timeout
+        keys = [request_key(payload) for payload in payloads]
+        results = [self.cached(key) for key in keys]
+
+        # Identical requests inside one batch are only computed once
+        pending = OrderedDict()
+        for key, payload, result in zip(keys, payloads, results):
+            if result is None and key not in pending:
+                pending[key] = payload
+
+        if pending:
+            worker = partial(run_allocation, deadline=deadline, solve_time=self.solve_time)
+            computed = self.pool.map_async(worker, list(pending.values())).get(self.timeout + POOL_GRACE_SECONDS)
+            fresh = dict(zip(pending, computed))
+            for key, result in fresh.items():
+                self.store(key, result)
+            results = [result if result is not None else fresh[key] for key, result in zip(keys, results)]
+
+        statuses = [result.get("status") for result in results]
+        with self.lock:
+            self.counts["allocations"] += len(payloads)
+            self.counts["computed"] += len(pending)
+            self.counts["client_errors"] += statuses.count(400)
+            self.counts["internal_errors"] += statuses.count(500)
+            self.counts["timeouts"] += statuses.count(504)
+        return results
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def record(self, seconds):
+        with self.lock:
+            self.counts["requests"] += 1
+            self.latencies.append(seconds)
+
+    def metrics(self):
+        with self.lock:
+            counts = dict(self.counts)
+            latencies = sorted(self.latencies)
+            cache_entries = len(self.cache)
+
+        uptime = time.time() - self.started
+        metrics = {
+            "uptime_seconds": round(uptime, 3),
+            "workers": self.workers,
+            "max_batch_size": self.max_batch_size,
+            "cache_entries": cache_entries,
+            "cache_hit_rate": round(counts["cache_hits"] / max(counts["allocations"], 1), 4),
+            "requests_per_second": round(counts["requests"] / uptime, 3) if uptime > 0 else 0.0,
+            "allocations_per_second": round(counts["allocations"] / uptime, 3) if uptime > 0 else 0.0,
+            **counts
+        }
+        if latencies:
+            metrics["latency_ms"] = {
+                "p50": round(percentile(latencies, 50) * 1000, 3),
+                "p90": round(percentile(latencies, 90) * 1000, 3),
+                "p99": round(percentile(latencies, 99) * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3)
+            }
+        return metrics
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+class AllocationHandler(BaseHTTPRequestHandler):
+    """Routes HTTP requests to the shared AllocationService"""
+
+    service = None
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self.send_json(200, self.service.metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        try:
+            if self.path == "/allocate":
+                result = self.service.allocate_many([self.read_json()])[0]
+                self.send_json(result.get("status", 200), result)
+            elif self.path == "/allocate/batch":
+                body = self.read_json()
+                requests = body.get("requests") if isinstance(body, dict) else None
+                if not isinstance(requests, list) or not requests:
+                    raise ValueError("'requests' must be a non-empty list")
+                self.send_json(200, {"results": self.service.allocate_many(requests)})
+            else:
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+        except ValueError as e:
+            self.service.count("client_errors")
+            self.send_json(400, {"error": str(e), "status": 400})
+        except multiprocessing.TimeoutError:
+            self.service.count("timeouts")
+            self.send_json(504, {"error": "Allocation timed out", "status": 504})
+        except Exception:
+            # Always answer, so a bug never leaves the client without a response
+            traceback.print_exc()
+            self.service.count("internal_errors")
+            self.send_json(500, {"error": "Internal error", "status": 500})
+        finally:
+            self.service.record(time.perf_counter() - start)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length < 0:
+            raise ValueError("Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise ValueError("Request body is too large")
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # /metrics covers request logging; keep stderr quiet under load
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve grant hour allocations over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="allocation worker processes")
+    parser.add_argument("--cache-size", type=int, default=1024, help="identical requests to remember (0 disables)")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds allowed per request")
+    parser.add_argument("--solve-time", type=float, default=1.0, help="seconds allowed per allocation")
+    args = parser.parse_args()
+
+    service = AllocationService(args.workers, args.cache_size, args.timeout, args.solve_time)
+    AllocationHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), AllocationHandler)
+    print(f"Serving allocations on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    main()
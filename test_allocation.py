@@ -0,0 +1,160 @@
+"""Tests for allocation.py - run with python -m pytest"""
+import io
+import re
+import time
+
+import pandas as pd
+import pytest
+
+from allocation import (
+    GRANT_COLUMNS,
+    WORKDAYS,
+    allocate_constrained_hours,
+    allocate_hours,
+    build_pattern_index,
+    pattern_for_employee
+)
+
+def schedule_csv(rows):
+    return pd.DataFrame(rows, columns=["Employee", "Week", "Day", "Grant", "Hours"]).to_csv(index=False)
+
+def test_pattern_index_does_not_depend_on_chunksize():
+    # Employee B never works Mondays, so some chunks have no Monday columns
+    rows = [("A", week, day, "ASA #3", 8.0) for week in [1, 2] for day in WORKDAYS]
+    rows += [("B", week, day, "ASA #3", 8.0) for week in [1, 2] for day in WORKDAYS[1:]]
+    older = schedule_csv(rows)
+    newer = schedule_csv([(employee, week, day, "UHP #4", hours / 2) for employee, week, day, _, hours in rows])
+
+    small = build_pattern_index([io.StringIO(older), io.StringIO(newer)], chunksize=10)
+    large = build_pattern_index([io.StringIO(older), io.StringIO(newer)], chunksize=10000)
+
+    pd.testing.assert_frame_equal(small, large)
+    assert not small.isna().any().any()
+    assert sum(pattern_for_employee(small, "B")["ASA #3"]) > 0
+
+def test_pattern_index_normalises_week_and_day():
+    clean = "Week,Day,Grant,Hours\n1,Monday,ASA #3,4\n2,Friday,ASA #3,2\n"
+    messy = "Week,Day,Grant,Hours\n1.0,monday,ASA #3,4\n2.0, FRIDAY ,ASA #3,2\n"
+    pd.testing.assert_frame_equal(
+        build_pattern_index([io.StringIO(messy)]), build_pattern_index([io.StringIO(clean)])
+    )
+
+@pytest.mark.parametrize("row, line", [(",Tuesday,ASA #3,4", 3), ("2,Saturday,ASA #3,4", 3), ("3,Monday,ASA #3,4", 3)])
+def test_pattern_index_rejects_rows_outside_the_period(row, line):
+    csv = f"Week,Day,Grant,Hours\n1,Monday,ASA #3,4\n{row}\n2,Friday,ASA #3,2\n"
+    with pytest.raises(ValueError, match=f"line {line} "):
+        build_pattern_index([io.StringIO(csv)], chunksize=1)
+
+def grants_frame(rows):
+    return pd.DataFrame(rows).reindex(columns=GRANT_COLUMNS)
+
+def daily_hours(schedule, index):
+    return {(week, day): schedule[week][day][index] for week in [1, 2] for day in WORKDAYS}
+
+def day_totals(schedule):
+    return [sum(schedule[week][day]) for week in [1, 2] for day in WORKDAYS]
+
+def grant_totals(schedule, grants):
+    return [sum(daily_hours(schedule, i).values()) for i in range(len(grants))]
+
+# Rules read off a real two-week schedule: every grant is held to the days and
+# the largest block it actually used, which leaves very little slack
+TIGHT_GRANTS = [
+    (7.75, "Tuesday, Friday", 3.0),
+    (3.5, "Thursday", 3.5),
+    (2.75, "Friday", 2.75),
+    (12.0, "Wednesday, Friday", 7.25),
+    (11.0, "Monday, Wednesday, Thursday, Friday", 4.5),
+    (4.75, "Thursday", 4.75),
+    (7.0, "Tuesday, Thursday", 3.5),
+    (5.25, "Monday, Tuesday", 2.75),
+    (2.5, "Friday", 2.5),
+    (4.25, "Monday, Tuesday, Friday", 2.0),
+    (6.25, "Tuesday, Wednesday, Thursday, Friday", 2.25),
+    (0.5, "Friday", 0.5),
+    (11.0, "Monday, Tuesday, Wednesday, Thursday", 6.0),
+    (1.5, "Monday", 1.5),
+]
+
+def test_constrained_schedule_follows_every_rule():
+    grants_data = grants_frame([
+        {"Grant Name": "ASA #3", "Maximum Hours": 30, "Allowed Days": "Mon, Wed, Fri", "Min Daily Hours": 2},
+        {"Grant Name": "UHP #4", "Maximum Hours": 20, "Max Daily Hours": 3, "Pinned Hours": "Tue=3"},
+        {"Grant Name": "Non-Grant", "Maximum Hours": 30, "Pinned Hours": "Fri=1.5, Mon=0"},
+    ])
+    for seed in range(5):
+        schedule, grants = allocate_hours(grants_data, seed=seed)
+
+        asa = daily_hours(schedule, 0)
+        assert all(hours == 0 for (_, day), hours in asa.items() if day not in ["Monday", "Wednesday", "Friday"])
+        assert all(hours == 0 or hours >= 2 for hours in asa.values())
+
+        uhp = daily_hours(schedule, 1)
+        assert max(uhp.values()) <= 3
+        assert uhp[(1, "Tuesday")] == uhp[(2, "Tuesday")] == 3
+
+        non_grant = daily_hours(schedule, 2)
+        assert non_grant[(1, "Friday")] == non_grant[(2, "Friday")] == 1.5
+        assert non_grant[(1, "Monday")] == non_grant[(2, "Monday")] == 0
+
+def test_exact_at_80_hours():
+    grants_data = grants_frame([
+        {"Grant Name": "ASA #3", "Maximum Hours": 45.25, "Max Daily Hours": 6},
+        {"Grant Name": "UHP #4", "Maximum Hours": 34.75, "Min Daily Hours": 1},
+    ])
+    schedule, grants = allocate_hours(grants_data, seed=1)
+    assert day_totals(schedule) == [8.0] * 10
+    assert grant_totals(schedule, grants) == [45.25, 34.75]
+
+def test_under_80_hours_uses_every_grant_in_full():
+    grants_data = grants_frame([
+        {"Grant Name": "ASA #3", "Maximum Hours": 30, "Allowed Days": "Mon, Tue"},
+        {"Grant Name": "UHP #4", "Maximum Hours": 20.5, "Min Daily Hours": 1},
+    ])
+    schedule, grants = allocate_hours(grants_data, seed=2)
+    assert grant_totals(schedule, grants) == [30, 20.5]
+    assert all(total <= 8 for total in day_totals(schedule))
+
+def test_over_80_hours_fills_every_day():
+    grants_data = grants_frame([
+        {"Grant Name": "ASA #3", "Maximum Hours": 50, "Max Daily Hours": 5},
+        {"Grant Name": "UHP #4", "Maximum Hours": 50, "Pinned Hours": "Fri=4"},
+    ])
+    schedule, grants = allocate_hours(grants_data, seed=3)
+    assert day_totals(schedule) == [8.0] * 10
+    assert all(used <= hours for used, (_, hours) in zip(grant_totals(schedule, grants), grants))
+    assert daily_hours(schedule, 1)[(2, "Friday")] == 4
+
+@pytest.mark.parametrize("rows, message", [
+    ([{"Grant Name": "ASA #3", "Maximum Hours": 40, "Max Daily Hours": 1, "Pinned Hours": "Fri=2"}],
+     "ASA #3: pinned hours on Friday exceed"),
+    ([{"Grant Name": "ASA #3", "Maximum Hours": 40, "Min Daily Hours": 3, "Pinned Hours": "Mon=0.5"}],
+     "ASA #3: pinned hours on Monday are below"),
+    ([{"Grant Name": "ASA #3", "Maximum Hours": 40, "Allowed Days": "Mon"}],
+     "ASA #3: needs 40.00 hours"),
+    ([{"Grant Name": "ASA #3", "Maximum Hours": 40, "Allowed Days": "Mon", "Pinned Hours": "Tue=2"}],
+     "ASA #3: pinned hours on Tuesday but Tuesday is not an allowed day"),
+    ([{"Grant Name": "ASA #3", "Maximum Hours": 3, "Min Daily Hours": 5}],
+     "ASA #3: 3.00 hours can't be split"),
+    ([{"Grant Name": "ASA #3", "Maximum Hours": 40, "Allowed Days": "Someday"}],
+     "Unknown day 'Someday'"),
+])
+def test_conflicting_rules_name_the_grant(rows, message):
+    grants_data = grants_frame(rows + [{"Grant Name": "Non-Grant", "Maximum Hours": 40}])
+    with pytest.raises(ValueError, match=re.escape(message)):
+        allocate_hours(grants_data, seed=0)
+
+def test_tight_14_grant_schedule_solves_well_under_a_second():
+    grants_data = grants_frame([
+        {"Grant Name": f"Grant {i + 1}", "Maximum Hours": hours, "Allowed Days": days,
+         "Min Daily Hours": 0.5, "Max Daily Hours": max_daily}
+        for i, (hours, days, max_daily) in enumerate(TIGHT_GRANTS)
+    ])
+    assert sum(hours for hours, _, _ in TIGHT_GRANTS) == 80
+
+    for seed in range(10):
+        start = time.perf_counter()
+        schedule, grants = allocate_constrained_hours(grants_data, seed=seed)
+        assert time.perf_counter() - start < 0.5
+        assert day_totals(schedule) == [8.0] * 10
+        assert grant_totals(schedule, grants) == [hours for hours, _, _ in TIGHT_GRANTS]
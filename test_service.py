@@ -0,0 +1,144 @@
+"""Tests for service.py - run with python -m pytest"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import service
+from service import AllocationHandler, AllocationService, run_allocation, validate_request
+
+REQUEST = {
+    "grants": [
+        {"Grant Name": "ASA #3", "Maximum Hours": 40, "Max Daily Hours": 5},
+        {"Grant Name": "Non-Grant", "Maximum Hours": 40}
+    ],
+    "seed": 7
+}
+
+@pytest.fixture
+def allocation_service():
+    allocation_service = AllocationService(workers=1, cache_size=16, timeout=30)
+    yield allocation_service
+    allocation_service.close()
+
+def serve(allocation_service):
+    """Start the HTTP handler on a free port and return its base URL"""
+    AllocationHandler.service = allocation_service
+    server = ThreadingHTTPServer(("127.0.0.1", 0), AllocationHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+@pytest.mark.parametrize("payload, message", [
+    ([], "must be a JSON object"),
+    ({"grants": []}, "'grants' must be a non-empty list"),
+    ({"grants": [{"Maximum Hours": 40}]}, "needs a 'Grant Name'"),
+    ({"grants": [{"Grant Name": "ASA #3", "Maximum Hours": float("inf")}]}, "'Maximum Hours' must be a number"),
+    ({"grants": [{"Grant Name": "ASA #3", "Maximum Hours": 1e9}]}, "'Maximum Hours' must be a number"),
+    ({"grants": [{"Grant Name": "ASA #3", "Maximum Hours": 40, "Colour": "red"}]}, "unknown fields Colour"),
+    ({"grants": [{"Grant Name": "ASA #3", "Maximum Hours": 40, "Max Daily Hours": 9}]}, "'Max Daily Hours' must be"),
+    ({"grants": [{"Grant Name": "ASA #3", "Maximum Hours": 40, "Allowed Days": ["Mon"]}]}, "must be a string"),
+    ({"grants": [{"Grant Name": "ASA #3", "Maximum Hours": 40}] * 2}, "Grant names must be unique"),
+    ({**REQUEST, "warm_start": {"ASA #3": [4] * 9}}, "must list hours for all 10 days"),
+    ({**REQUEST, "warm_start": {"ASA #3": [9] * 10}}, "must use hours from 0 to 8"),
+    ({**REQUEST, "seed": True}, "'seed' must be an integer"),
+])
+def test_validate_request_rejects(payload, message):
+    with pytest.raises(ValueError, match=message):
+        validate_request(payload)
+
+def test_repeat_request_is_answered_from_the_cache(allocation_service):
+    first = allocation_service.allocate_many([REQUEST])[0]
+    second = allocation_service.allocate_many([REQUEST])[0]
+
+    assert "error" not in first
+    assert second == first
+    assert allocation_service.counts["cache_hits"] == 1
+    assert allocation_service.counts["computed"] == 1
+
+def test_duplicates_in_a_batch_are_computed_once(allocation_service):
+    results = allocation_service.allocate_many([REQUEST, REQUEST, REQUEST])
+
+    assert results[0] == results[1] == results[2]
+    assert allocation_service.counts["computed"] == 1
+
+def test_bad_item_does_not_fail_the_batch(allocation_service):
+    bad = {"grants": [{"Grant Name": "ASA #3", "Maximum Hours": -1}]}
+    good, failed = allocation_service.allocate_many([REQUEST, bad])
+
+    assert "schedule" in good
+    assert failed["status"] == 400
+    assert "'Maximum Hours' must be a number" in failed["error"]
+    assert allocation_service.counts["client_errors"] == 1
+
+def test_batch_limit_follows_the_timeout():
+    allocation_service = AllocationService(workers=2, cache_size=0, timeout=3, solve_time=0.5)
+    try:
+        assert allocation_service.max_batch_size == 12
+        with pytest.raises(ValueError, match="At most 12 requests"):
+            allocation_service.allocate_many([REQUEST] * 13)
+    finally:
+        allocation_service.close()
+
+def test_internal_errors_are_not_reported_as_bad_requests(monkeypatch):
+    def broken(*args, **kwargs):
+        raise KeyError("Week 1")
+    monkeypatch.setattr(service, "allocate_hours", broken)
+
+    result = run_allocation(REQUEST)
+    assert result == {"error": "Internal error", "status": 500}
+
+def test_work_past_the_deadline_is_skipped(monkeypatch):
+    def never(*args, **kwargs):
+        raise AssertionError("allocation should not start after the deadline")
+    monkeypatch.setattr(service, "allocate_hours", never)
+
+    assert run_allocation(REQUEST, deadline=time.time() - 1)["status"] == 504
+
+def test_timed_out_request_returns_504():
+    allocation_service = AllocationService(workers=1, cache_size=16, timeout=0)
+    server, url = serve(allocation_service)
+    try:
+        status, body = post(url + "/allocate", REQUEST)
+        assert status == 504
+        assert body["error"] == "Allocation timed out"
+
+        metrics = allocation_service.metrics()
+        assert metrics["timeouts"] == 1
+        assert metrics["cache_entries"] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+        allocation_service.close()
+
+def test_handler_reports_status_and_counts(allocation_service):
+    server, url = serve(allocation_service)
+    try:
+        assert post(url + "/allocate", REQUEST)[0] == 200
+        status, body = post(url + "/allocate", {"grants": []})
+        assert status == 400
+        assert body["status"] == 400
+
+        status, body = post(url + "/allocate/batch", {"requests": [REQUEST, {"grants": []}]})
+        assert status == 200
+        assert "schedule" in body["results"][0]
+        assert body["results"][1]["status"] == 400
+
+        metrics = allocation_service.metrics()
+        assert metrics["client_errors"] == 2
+        assert metrics["internal_errors"] == 0
+        assert metrics["cache_hits"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()